@@ -0,0 +1,325 @@
+# Alpaca plumbing: REST clients, asset/tradability caches, the live position
+# map, and order helpers. Everything Flask-independent lives here so the
+# webhook module stays a thin HTTP layer.
+import requests as requests_lib
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
+import httpx
+import redis
+import os, logging, threading, time, asyncio, uuid
+
+# ── Config (via Render Environment) ───────────────────────────────────────
+ALPACA_KEY     = os.getenv("ALPACA_API_KEY")
+ALPACA_SECRET  = os.getenv("ALPACA_API_SECRET")
+BASE_URL       = os.getenv("ALPACA_BASE_URL", "https://paper-api.alpaca.markets")
+DATA_URL       = os.getenv("ALPACA_DATA_URL", "https://data.alpaca.markets")
+
+# Cash cap per position (USD). BUY uses fractional notional; SELL uses whole-share qty sized ~ to this cap.
+TRADE_NOTIONAL_USD = float(os.getenv("TRADE_NOTIONAL_USD", "100"))
+
+# Alpaca SDK client (cold-path endpoints: list_*, streams). Importing
+# alpaca_trade_api pulls in pandas/numpy/msgpack — multi-second on Render's
+# free tier — so both the import and the REST construction are deferred
+# until something actually needs the SDK.
+_api = None
+_api_lock = threading.Lock()
+
+def get_api():
+    global _api
+    if _api is None:
+        with _api_lock:
+            if _api is None:
+                import alpaca_trade_api as tradeapi
+                api = tradeapi.REST(ALPACA_KEY, ALPACA_SECRET, BASE_URL, api_version="v2")
+                # Force a persistent pooled session so every call after the
+                # first reuses the TLS connection (~100ms handshake to
+                # paper-api otherwise). urllib3's pool is thread-safe.
+                api._session = requests_lib.Session()
+                adapter = requests_lib.adapters.HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=16,
+                    max_retries=Retry(total=2, backoff_factor=0.1),
+                )
+                api._session.mount("https://", adapter)
+                api._session.headers.update({
+                    "Connection": "keep-alive",
+                    "Keep-Alive": "timeout=60, max=1000",
+                    "APCA-API-KEY-ID": ALPACA_KEY or "",
+                    "APCA-API-SECRET-KEY": ALPACA_SECRET or "",
+                })
+                _api = api
+    return _api
+
+# HTTP/2 client for the hot-path REST calls. HTTP/2 multiplexes the parallel
+# preflight requests over a single TLS connection instead of one socket each;
+# the httpx sync client is thread-safe, so EXEC's threads share it directly.
+http = httpx.Client(
+    http2=True,
+    headers={
+        "APCA-API-KEY-ID": ALPACA_KEY or "",
+        "APCA-API-SECRET-KEY": ALPACA_SECRET or "",
+    },
+    limits=httpx.Limits(max_keepalive_connections=8, keepalive_expiry=60),
+    timeout=5.0,
+)
+
+# Pool for firing independent Alpaca preflight calls in parallel
+# (asset check / position / latest price are ~1×RTT each run sequentially).
+EXEC = ThreadPoolExecutor(max_workers=8)
+
+def normalize_symbol(raw) -> str:
+    return str(raw or "TSLA").upper()
+
+# ── Position map fed by the trade-updates WebSocket ───────────────────────
+# One persistent stream keeps POSITIONS current, so get_pos_qty is a dict
+# lookup instead of an HTTPS round trip. Primed from list_positions on
+# (re)connect; while the stream is down we fall back to REST.
+#
+# Alpaca allows only one concurrent trade-updates connection per account,
+# and the Celery prefork pool means several processes would each try to
+# open one — a Redis lease elects a single owner; the rest keep using the
+# REST fallback and re-check the lease periodically.
+USE_TRADE_STREAM = os.getenv("USE_TRADE_STREAM", "true").lower() == "true"
+POSITIONS: dict[str, int] = {}
+_stream_ready = threading.Event()
+_last_stream_msg = 0.0
+
+STREAM_LEADER_KEY = "stream:leader"
+STREAM_LEADER_TTL = 60
+_instance_id = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_stream_redis = redis.Redis.from_url(
+    os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+    decode_responses=True,
+    socket_keepalive=True,
+)
+
+def _try_lead() -> bool:
+    """Claim or confirm the stream lease for this process."""
+    if _stream_redis.set(STREAM_LEADER_KEY, _instance_id, nx=True,
+                         ex=STREAM_LEADER_TTL):
+        return True
+    return _stream_redis.get(STREAM_LEADER_KEY) == _instance_id
+
+def _refresh_lease():
+    while True:
+        time.sleep(STREAM_LEADER_TTL // 3)
+        try:
+            if _stream_redis.get(STREAM_LEADER_KEY) == _instance_id:
+                _stream_redis.expire(STREAM_LEADER_KEY, STREAM_LEADER_TTL)
+        except Exception:
+            pass
+
+async def _on_trade_update(tu):
+    global _last_stream_msg
+    _last_stream_msg = time.time()
+    if tu.event in ("fill", "partial_fill", "canceled"):
+        try:
+            # position_qty is already signed (negative when short)
+            POSITIONS[tu.order["symbol"]] = int(float(tu.position_qty or 0))
+        except (AttributeError, KeyError, TypeError, ValueError):
+            pass
+
+def _prime_positions():
+    global _last_stream_msg
+    POSITIONS.clear()
+    for p in get_api().list_positions():
+        q = int(float(p.qty))
+        POSITIONS[p.symbol] = q if p.side == "long" else -q
+    _last_stream_msg = time.time()
+
+_reprime_lock = threading.Lock()
+
+def _reprime():
+    """Background refetch when the stream has gone quiet for too long."""
+    if not _reprime_lock.acquire(blocking=False):
+        return
+    try:
+        _prime_positions()
+    except Exception as e:
+        logging.warning("⚠️ Position re-prime failed: %s", e)
+    finally:
+        _reprime_lock.release()
+
+def _run_trade_stream():
+    from alpaca_trade_api.stream import Stream
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    backoff = 2
+    while True:
+        try:
+            if not _try_lead():
+                time.sleep(STREAM_LEADER_TTL // 4)
+                continue
+        except Exception:
+            time.sleep(STREAM_LEADER_TTL // 4)
+            continue
+        try:
+            _prime_positions()
+            stream = Stream(ALPACA_KEY, ALPACA_SECRET, base_url=BASE_URL)
+            stream.subscribe_trade_updates(_on_trade_update)
+            _stream_ready.set()
+            backoff = 2                      # connected — reset the backoff
+            stream.run()                     # blocks until the socket drops
+        except Exception as e:
+            logging.warning("⚠️ Trade stream dropped, reconnecting in %ss: %s",
+                            backoff, e)
+        finally:
+            _stream_ready.clear()
+        time.sleep(backoff)
+        backoff = min(backoff * 2, 60)
+
+# Started lazily from the first position lookup rather than at import:
+# under gunicorn --preload the module loads in the master, and neither
+# threads nor their sockets survive the fork into workers.
+_stream_started = False
+_stream_start_lock = threading.Lock()
+
+def _ensure_stream():
+    global _stream_started
+    if _stream_started or not USE_TRADE_STREAM:
+        return
+    with _stream_start_lock:
+        if not _stream_started:
+            threading.Thread(target=_run_trade_stream, daemon=True,
+                             name="trade-stream").start()
+            threading.Thread(target=_refresh_lease, daemon=True,
+                             name="trade-stream-lease").start()
+            _stream_started = True
+
+# ── Asset tradability ─────────────────────────────────────────────────────
+# Asset metadata changes on the order of days, so cache the tradable flag
+# for an hour instead of paying an HTTPS round trip on every alert.
+_asset_cache: TTLCache = TTLCache(maxsize=1024, ttl=3600)
+_asset_lock = threading.Lock()
+
+# With PRELOAD_ASSETS=1 the whole active-asset universe is fetched on first
+# use, so even the first alert per symbol skips the per-symbol asset lookup.
+# Loaded lazily, not at import — under --preload an import-time fetch would
+# open sockets in the gunicorn master. Each process re-pulls its own copy
+# once the 6h TTL lapses (a beat task would only refresh the one prefork
+# child that ran it), keeping stale data around on failure rather than
+# blocking alerts.
+PRELOAD_ASSETS = os.getenv("PRELOAD_ASSETS", "") == "1"
+TRADABLE_TTL = 6 * 3600
+TRADABLE: frozenset[str] | None = None
+_tradable_loaded_at = 0.0
+_tradable_lock = threading.Lock()
+
+def _load_tradable():
+    global TRADABLE, _tradable_loaded_at
+    assets = get_api().list_assets(status="active")
+    TRADABLE = frozenset(a.symbol for a in assets if a.tradable)
+    _tradable_loaded_at = time.time()
+    logging.info("📦 Preloaded %s tradable symbols", len(TRADABLE))
+
+def _tradable_stale() -> bool:
+    return TRADABLE is None or time.time() - _tradable_loaded_at > TRADABLE_TTL
+
+def is_tradable(symbol: str) -> bool:
+    """Cached asset.tradable check; raises if the asset is unknown."""
+    if PRELOAD_ASSETS:
+        if _tradable_stale():
+            with _tradable_lock:
+                if _tradable_stale():
+                    try:
+                        _load_tradable()
+                    except Exception as e:
+                        if TRADABLE is None:
+                            raise
+                        logging.warning("⚠️ Asset refresh failed, serving "
+                                        "stale universe: %s", e)
+        return symbol in TRADABLE
+    with _asset_lock:
+        hit = _asset_cache.get(symbol)
+    if hit is not None:
+        return hit
+    resp = http.get(f"{BASE_URL}/v2/assets/{symbol}")
+    resp.raise_for_status()
+    tradable = bool(resp.json().get("tradable"))
+    with _asset_lock:
+        _asset_cache[symbol] = tradable
+    return tradable
+
+# ── Positions / prices / orders ───────────────────────────────────────────
+def get_pos_qty(symbol: str) -> int:
+    """+qty for long, -qty for short, 0 if flat/not found."""
+    _ensure_stream()
+    if _stream_ready.is_set():
+        # A connected-but-dead socket must not serve stale positions:
+        # if nothing has arrived for 30s, kick off a re-prime and answer
+        # this call from REST instead.
+        if time.time() - _last_stream_msg <= 30:
+            return POSITIONS.get(symbol, 0)
+        EXEC.submit(_reprime)
+    try:
+        resp = http.get(f"{BASE_URL}/v2/positions/{symbol}")
+        resp.raise_for_status()
+        p = resp.json()
+        q = int(float(p["qty"]))
+        return q if p["side"] == "long" else -q
+    except Exception:
+        return 0
+
+def close_all(symbol: str):
+    """Close any open position (long or short)."""
+    pos = get_pos_qty(symbol)
+    if pos == 0:
+        logging.info("↪️  %s: already flat, nothing to close.", symbol)
+        return
+    try:
+        http.delete(f"{BASE_URL}/v2/positions/{symbol}").raise_for_status()
+        logging.info("✅ Closed all positions for %s", symbol)
+    except Exception as e:
+        logging.error("❌ Close error %s: %s", symbol, e)
+
+def latest_price(symbol: str) -> float | None:
+    """Best-effort latest trade price; returns None on failure."""
+    try:
+        resp = http.get(f"{DATA_URL}/v2/stocks/{symbol}/trades/latest")
+        resp.raise_for_status()
+        return float(resp.json()["trade"]["p"])
+    except Exception as e:
+        logging.warning("⚠️ Latest price unavailable for %s: %s", symbol, e)
+        return None
+
+def submit_order(**order):
+    """POST an order over the shared HTTP/2 connection."""
+    resp = http.post(f"{BASE_URL}/v2/orders", json=order)
+    resp.raise_for_status()
+    return resp.json()
+
+def place_notional_buy(symbol: str):
+    """BUY with fractional notional. Must be DAY TIF."""
+    submit_order(
+        symbol=symbol,
+        side="buy",
+        type="market",
+        time_in_force="day",           # required for fractional/notional
+        notional=TRADE_NOTIONAL_USD
+    )
+    logging.info("🧩 BUY %s notional $%s (DAY)", symbol, TRADE_NOTIONAL_USD)
+
+def qty_for_notional(px: float | None) -> int:
+    """Whole-share qty approximating the notional cap; falls back to 1."""
+    if px and px > 0:
+        return max(1, int(TRADE_NOTIONAL_USD // px))
+    return 1
+
+def place_qty_sell(symbol: str, px: float | None = None):
+    """
+    SELL to open short with whole shares (fractional shorting not allowed).
+    Sizes qty approximately to the notional cap using latest price; falls back to qty=1.
+    """
+    if px is None:
+        px = latest_price(symbol)
+    qty = qty_for_notional(px)
+    submit_order(
+        symbol=symbol,
+        side="sell",
+        type="market",
+        time_in_force="gtc",           # whole shares okay as GTC
+        qty=qty
+    )
+    approx = f"~${qty * (px or 0):.2f}" if px else "~$unknown"
+    logging.info("🧩 SELL %s qty %s (%s)", symbol, qty, approx)
@@ -0,0 +1,295 @@
+# HTTP layer + Celery task. Single entrypoint: gunicorn app.webhook:app
+from flask import Flask, request, jsonify
+from celery import Celery
+import msgspec
+import orjson
+import redis
+import os, logging, threading, hashlib, hmac, time, uuid
+
+from app.alpaca_client import (
+    BASE_URL,
+    EXEC,
+    http,
+    close_all,
+    get_pos_qty,
+    is_tradable,
+    latest_price,
+    normalize_symbol,
+    place_notional_buy,
+    place_qty_sell,
+)
+import httpx
+
+app = Flask(__name__)
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+# Skip per-record pid/thread lookups — the format above never prints them.
+logging.logProcesses = False
+logging.logThreads = False
+logging.logMultiprocessing = False
+logging.raiseExceptions = False
+
+# orjson is 3-10x faster than stdlib json for these small dict payloads;
+# routing Flask's provider through it makes jsonify() use it too.
+class ORJSONProvider(app.json_provider_class):
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+app.json = ORJSONProvider(app)
+
+# Webhook payload schema. msgspec fuses parse+validate+coerce into one
+# C-level pass, so the route never touches an intermediate dict.
+class Alert(msgspec.Struct):
+    alert: str
+    symbol: str = "TSLA"
+    qty: int = 1
+    price: float = 0.0
+    id: str | None = None
+    secret: str | None = None      # legacy in-band secret, ignored
+
+_alert_decoder = msgspec.json.Decoder(Alert)
+
+# Celery worker pool (Redis broker). Webhooks enqueue and return immediately;
+# run workers with: celery -A app.webhook.celery worker --concurrency=8
+celery = Celery("trader", broker=os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")                 # optional
+ALLOW_SHORTS   = os.getenv("ALLOW_SHORTS", "true").lower() == "true"
+
+# Last action per symbol ("BUY" | "SELL" | "FLAT") lives in Redis so
+# duplicate-signal suppression works across Gunicorn workers and survives
+# restarts. redis-py pools connections per client by default.
+r = redis.Redis.from_url(
+    os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+    decode_responses=True,
+    socket_keepalive=True,
+)
+
+def get_last_signal(symbol: str) -> str:
+    return r.get(f"sig:{symbol}") or "FLAT"
+
+def set_last_signal(symbol: str, sig: str):
+    r.set(f"sig:{symbol}", sig, ex=86400)
+
+# ── Routes ────────────────────────────────────────────────────────────────
+@app.get("/")
+@app.get("/healthz")
+def health():
+    # Pure liveness: no jsonify, no Alpaca. Safe to poll at 1Hz.
+    return b"ok", 200
+
+# Readiness pings Alpaca at most every 30s so load balancers and monitors
+# can't eat the 200/min paper-trading rate limit.
+_ready_cache = (0.0, True)
+
+@app.get("/readyz")
+def ready():
+    global _ready_cache
+    now = time.time()
+    ts, ok = _ready_cache
+    if now - ts > 30:
+        try:
+            http.get(f"{BASE_URL}/v2/clock").raise_for_status()
+            ok = True
+        except Exception:
+            ok = False
+        _ready_cache = (now, ok)
+    return (b"ok", 200) if ok else (b"down", 503)
+
+@app.post("/webhook")
+def webhook():
+    # Optional HMAC over the raw body, checked in constant time *before* JSON
+    # parsing so bad floods are rejected at the cheapest possible point.
+    body = request.get_data()
+    if WEBHOOK_SECRET:
+        sig = request.headers.get("X-Signature", "")
+        mac = hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(sig, mac):
+            app.logger.warning("Unauthorized webhook: bad or missing X-Signature")
+            return jsonify(error="unauthorized"), 403
+
+    # Parse+validate straight off the raw body in one msgspec pass
+    try:
+        msg = _alert_decoder.decode(body)
+    except msgspec.DecodeError as e:
+        return jsonify(error=str(e)), 400
+
+    # Shape check only — everything that talks to Alpaca runs in the worker,
+    # so TradingView gets its 200 back before it can time out and retry.
+    action = msg.alert.upper()                           # BUY | SELL | CLOSE
+    if action not in HANDLERS:
+        return jsonify(error=f"unknown action {action}"), 400
+
+    # TradingView retries on timeout and replays the same alert (same bytes);
+    # dedupe on a client-supplied id or the raw-body hash before anything
+    # touches Alpaca.
+    idem = msg.id or hashlib.blake2b(body, digest_size=16).hexdigest()
+    if not r.set(f"idem:{idem}", 1, nx=True, ex=300):
+        logging.info("⏸  duplicate webhook (idem=%s), ignoring.", idem)
+        return jsonify(status="duplicate"), 200
+
+    process_alert.delay(msgspec.to_builtins(msg))
+    return jsonify(status="queued"), 202
+
+# ── Alert processing (Celery worker) ──────────────────────────────────────
+def handle_close(symbol: str, pos: int, f_px=None) -> str:
+    """CLOSE always allowed."""
+    close_all(symbol)
+    set_last_signal(symbol, "FLAT")
+    return "closed"
+
+def handle_buy(symbol: str, pos: int, f_px=None) -> str:
+    # If currently short, flatten first and wait for next BUY to open.
+    # Alpaca rejects orders that would flip a position through zero
+    # ("insufficient qty available"), so a single netted buy can't reverse;
+    # close_position also flattens fractional tails a whole-share order
+    # would strand. Flatten-and-wait always leaves a safe state.
+    if pos < 0:
+        logging.info("🔁 %s: short → flatten before long.", symbol)
+        close_all(symbol)
+        set_last_signal(symbol, "FLAT")
+        return "flattened_wait_reopen"
+
+    # Flat → open long with notional (fractional)
+    place_notional_buy(symbol)
+    set_last_signal(symbol, "BUY")
+    return "opened_long"
+
+def handle_sell(symbol: str, pos: int, f_px=None) -> str:
+    if not ALLOW_SHORTS:
+        logging.info("🚫 Shorting disabled; ignoring SELL for %s.", symbol)
+        return "shorts_disabled"
+
+    # If currently long, flatten first and wait for next SELL to open —
+    # same reasoning as the BUY side: no through-zero flips, and a second
+    # sell is rejected while the shares are tied up in the closing order.
+    if pos > 0:
+        logging.info("🔁 %s: long → flatten before short.", symbol)
+        close_all(symbol)
+        set_last_signal(symbol, "FLAT")
+        return "flattened_wait_reopen"
+
+    # Flat → open short using whole-share qty sized to cap
+    place_qty_sell(symbol, px=_future_result(f_px, None) if f_px else None)
+    set_last_signal(symbol, "SELL")
+    return "opened_short"
+
+# Dispatch computed once at import — new actions register here instead of
+# growing an if/elif ladder in the task body.
+HANDLERS = {"CLOSE": handle_close, "BUY": handle_buy, "SELL": handle_sell}
+
+# Per-symbol locks: two near-simultaneous alerts for one symbol must not both
+# read the old position and double-submit. The Redis SET NX lock guards across
+# worker processes; the threading.Lock guards threads within one.
+_locks: dict[str, threading.Lock] = {}
+_locks_lock = threading.Lock()
+
+def _symbol_lock(symbol: str) -> threading.Lock:
+    with _locks_lock:
+        lock = _locks.get(symbol)
+        if lock is None:
+            lock = _locks[symbol] = threading.Lock()
+    return lock
+
+# Lock TTL must exceed the worst-case hold (preflight futures plus order
+# submits at the 5s httpx timeout), or the lock expires mid-alert and a
+# second worker slips in.
+SYMBOL_LOCK_TTL = 15
+
+# Release only our own lock: if the TTL expired and another worker now
+# holds the key, an unconditional DEL would free *their* lock.
+_UNLOCK_SCRIPT = r.register_script("""
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+""")
+
+# Future timeouts must exceed the underlying client's own (httpx 5s): a
+# shorter .result() deadline raises where the helpers are built to degrade
+# (latest_price → None, get_pos_qty → 0) and would drop the whole alert.
+PREFLIGHT_TIMEOUT = 6
+
+def _future_result(f, default):
+    try:
+        return f.result(timeout=PREFLIGHT_TIMEOUT)
+    except Exception:
+        return default
+
+def _is_transient(e: Exception) -> bool:
+    """Alpaca 429s and 5xxs are worth retrying; 4xx order rejects are not."""
+    status = getattr(e, "status_code", None)
+    if status is None and isinstance(e, httpx.HTTPStatusError):
+        status = e.response.status_code
+    return status == 429 or (status is not None and status >= 500)
+
+@celery.task(bind=True, max_retries=3, default_retry_delay=1)
+def process_alert(self, data: dict):
+    # Inputs
+    action = str(data.get("alert", "")).upper()          # BUY | SELL | CLOSE
+    symbol = normalize_symbol(data.get("symbol"))
+    # price is informational; not required
+    _price = data.get("price")
+
+    # Claim the symbol across worker processes before reading any state.
+    # Contention is not a transient-Alpaca failure: it must not draw on the
+    # task's 3-retry budget, because a waiter that gives up drops the alert
+    # for good (its idem: key blocks upstream redelivery for 300s). Poll for
+    # up to the lock TTL, then re-queue with a budget sized to the TTL.
+    lock_id = self.request.id or uuid.uuid4().hex
+    deadline = time.monotonic() + SYMBOL_LOCK_TTL
+    while not r.set(f"lock:{symbol}", lock_id, nx=True, ex=SYMBOL_LOCK_TTL):
+        if time.monotonic() >= deadline:
+            logging.info("🔒 %s still busy after %ss, re-queueing alert.",
+                         symbol, SYMBOL_LOCK_TTL)
+            raise self.retry(countdown=1, max_retries=SYMBOL_LOCK_TTL)
+        time.sleep(0.5)
+    try:
+        with _symbol_lock(symbol):
+            return _process_alert_locked(self, action, symbol)
+    finally:
+        _UNLOCK_SCRIPT(keys=[f"lock:{symbol}"], args=[lock_id])
+
+def _process_alert_locked(self, action: str, symbol: str):
+    # Preflight calls are independent — fire them in parallel so latency
+    # is ~1×RTT instead of the sum of 2-3 round trips.
+    f_asset = EXEC.submit(is_tradable, symbol)
+    f_pos   = EXEC.submit(get_pos_qty, symbol)
+    f_px    = EXEC.submit(latest_price, symbol) if action == "SELL" else None
+
+    # Validate tradable asset (cached, so usually no network call)
+    try:
+        if not f_asset.result(timeout=PREFLIGHT_TIMEOUT):
+            logging.error("❌ %s not tradable", symbol)
+            return "not_tradable"
+    except Exception as e:
+        logging.error("❌ unknown asset %s: %s", symbol, e)
+        return "unknown_asset"
+
+    prev = get_last_signal(symbol)
+    pos  = _future_result(f_pos, 0)
+    logging.info("📨 %s got %s; prev=%s; pos=%s", symbol, action, prev, pos)
+
+    try:
+        # Duplicate signal? ignore (CLOSE is always allowed through)
+        if action != "CLOSE" and action == prev:
+            logging.info("⏸  %s: same signal (%s) as previous, ignoring.", symbol, action)
+            return "noop_same_signal"
+
+        return HANDLERS[action](symbol, pos, f_px)
+
+    except Exception as e:
+        # Common errors: insufficient buying power, PDT, etc.
+        logging.error("❌ Order error for %s: %s", symbol, e)
+        if _is_transient(e):
+            raise self.retry(exc=e)
+        return "error"
+
+# ── Entrypoint ────────────────────────────────────────────────────────────
+# Production runs under gunicorn via wsgi.py, which gevent-patches the
+# stdlib before this module (and ssl) is imported. The debug server below
+# serializes requests — local development only.
+if __name__ == "__main__" and os.getenv("FLASK_DEBUG"):
+    port = int(os.environ.get("PORT", "10000"))
+    app.run(host="0.0.0.0", port=port)
@@ -0,0 +1,12 @@
+# Gunicorn entrypoint. gevent must patch the stdlib before ssl/httpx/redis
+# are imported (patching after ssl is loaded is unsupported), and under
+# --preload the master imports the app before the gevent worker's own
+# init_process() would patch — so patch here, first. The Celery worker
+# imports app.webhook directly and stays unpatched.
+from gevent import monkey
+
+monkey.patch_all()
+
+from app.webhook import app  # noqa: E402
+
+__all__ = ["app"]